@@ -2,4 +2,24 @@ MAX_COLUMN_BYTES_NAME_LEN = 63
 
 INI_POSTGRES_NAME = "postgres"
 
-SET_UUID_ID = {"id", "uuid"}
\ No newline at end of file
+SET_UUID_ID = {"id", "uuid"}
+
+JSONB_INDEX_TABLE = "jsonb_indexes"  # контрольная таблица построенных индексов по JSONB
+
+HOT_PATH_RATIO = 0.5  # путь считается "горячим", если встречается хотя бы в такой доле записей
+
+MAX_JSON_PATH_DEPTH = 3  # на какую глубину профилируем вложенные объекты
+
+# Сколько generated колонок под горячие пути может быть у таблицы: каждая — STORED значение в каждой строке
+MAX_HOT_PATHS = 16
+
+# Строковые пути длиннее этого не индексируются (свободный текст), а значение в generated колонке
+# обрезается до этой длины: запись B-tree индекса в PostgreSQL ограничена ~2.7 КБ
+MAX_INDEXED_TEXT_LEN = 256
+
+# Тип скаляра (из determine_type) -> (jsonb_typeof, тип generated колонки). Остальные пишутся как TEXT
+JSONB_SCALAR_CASTS = {
+    "BOOLEAN": ("boolean", "BOOLEAN"),
+    "BIGINT": ("number", "NUMERIC"),
+    "DOUBLE PRECISION": ("number", "NUMERIC"),
+}
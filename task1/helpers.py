@@ -5,10 +5,10 @@ import uuid
 from configparser import ConfigParser
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 from config import ENV_FILE, INI_FILE
-from constants import INI_POSTGRES_NAME, MAX_COLUMN_BYTES_NAME_LEN
+from constants import INI_POSTGRES_NAME, MAX_COLUMN_BYTES_NAME_LEN, MAX_JSON_PATH_DEPTH
 from logger import logger
 
 
@@ -133,3 +133,29 @@ def serialize_value(value: Any) -> Any:
             return str(value)
         case _:
             return value
+
+
+def iter_json_paths(
+        value: dict[str, Any], prefix: tuple[str, ...] = (), depth: int = MAX_JSON_PATH_DEPTH
+) -> Iterator[tuple[tuple[str, ...], Any]]:
+    """
+    Обходит вложенный словарь и возвращает пути до скалярных значений.
+
+    - Вложенные словари обходятся не глубже depth уровней.
+    - Списки и None пропускаются: для поиска по ним используется GIN индекс по всей колонке.
+
+    :param value: словарь из JSONB колонки
+    :param prefix: путь до текущего словаря
+    :param depth: максимальная длина пути
+    :return: итератор пар (путь, значение), например (("department",), "Engineering")
+    """
+    for key, item in value.items():
+        path = prefix + (key,)
+        match item:
+            case dict():
+                if len(path) < depth:
+                    yield from iter_json_paths(item, path, depth)
+            case list() | None:
+                continue
+            case _:
+                yield path, item
@@ -15,9 +15,13 @@ def main():
     parser.add_argument(
         "--input", required=True, help="Путь к JSON файлу", type=str
     )
+    parser.add_argument(
+        "--index-jsonb", action="store_true",
+        help="Профилировать ключи JSONB колонок и строить по ним индексы после загрузки"
+    )
     args = parser.parse_args()
 
-    loader: PgJsonUpserter = PgJsonUpserter()
+    loader: PgJsonUpserter = PgJsonUpserter(index_jsonb=args.index_jsonb)
 
     try:
         with open(args.input, mode="r", encoding="utf-8") as file:
@@ -31,8 +35,20 @@ def main():
         loader.commit()
         logger.info(f"Вставлено: {inserted}, обновлено: {updated},"
                     f" добавлено колонок: {added_columns}")
-    except psycopg2.Error as err:
+    except (psycopg2.Error, ValueError) as err:
         logger.error(f"Произошла ошибка: <{err}>")
+        loader.close()
+        return
+
+    # Индексы строятся в отдельной транзакции: их ошибка не должна откатывать уже загруженные данные
+    try:
+        if args.index_jsonb:
+            created_indexes = loader.build_jsonb_indexes(args.table)
+            loader.commit()
+            logger.info(f"Создано JSONB индексов: {created_indexes}")
+    except psycopg2.Error as err:
+        loader.rollback()
+        logger.error(f"Ошибка при построении JSONB индексов, данные сохранены: <{err}>")
     finally:
         loader.close()
 
@@ -1,3 +1,4 @@
+import json
 from typing import Any
 
 import psycopg2
@@ -6,12 +7,20 @@ from psycopg2.extras import execute_values
 
 from logger import logger
 from config import INI_FILE
-from constants import SET_UUID_ID
+from constants import (
+    SET_UUID_ID,
+    JSONB_INDEX_TABLE,
+    HOT_PATH_RATIO,
+    MAX_HOT_PATHS,
+    MAX_INDEXED_TEXT_LEN,
+    JSONB_SCALAR_CASTS
+)
 from helpers import (
     read_ini_config,
     serialize_value,
     determine_type,
-    generate_alias
+    generate_alias,
+    iter_json_paths
 )
 
 
@@ -19,13 +28,18 @@ class PgJsonUpserter:
     """
     Класс для динамической вставки и обновления (UPSERT) JSON-записей в postgres.
         Автоматически создаёт таблицы и колонки по структуре входных данных,
-        определяет типы колонок и выполняет безопасные UPSERT-операции по ключам id или uuid
+        определяет типы колонок и выполняет безопасные UPSERT-операции по ключам id или uuid.
+        С index_jsonb=True профилирует ключи JSONB колонок и строит по ним индексы (build_jsonb_indexes)
     """
 
-    def __init__(self, config_path: str = INI_FILE):
+    def __init__(self, config_path: str = INI_FILE, index_jsonb: bool = False):
         cfg_kwargs = read_ini_config(config_path)
         self.conn = psycopg2.connect(**cfg_kwargs)
         self.conn.autocommit = False
+        self.index_jsonb = index_jsonb
+        # table -> column -> {"rows": кол-во объектов,
+        #                     "paths": {path: {"count": int, "types": set[str], "max_len": int}}}
+        self.jsonb_profile: dict[str, dict[str, dict]] = {}
 
     def close(self):
         self.conn.close()
@@ -33,6 +47,9 @@ class PgJsonUpserter:
     def commit(self):
         self.conn.commit()
 
+    def rollback(self):
+        self.conn.rollback()
+
     def alter_column(self, table: str, column: str, col_type: str):
         """
         Добавляет новую колонку в таблицу, если она отсутствует.
@@ -222,6 +239,225 @@ class PgJsonUpserter:
             ))
             logger.info(f"Создаю таблицу {table} c {pk_column} (если не существует)")
 
+    def profile_jsonb(
+            self, table: str, records: list[dict[str, Any]],
+            key_to_alias: dict[str, str], column_types: dict[str, str]
+    ) -> None:
+        """
+        Накапливает профиль путей до скалярных значений в JSONB колонках.
+
+        Для каждой колонки, которая в таблице действительно jsonb (тип из батча мог не совпасть с уже
+        существующей колонкой, например TEXT), считается, в скольких записях значение было объектом,
+        и сколько раз встретился каждый путь (с какими типами значений и максимальной длиной строки).
+        Индексы по профилю строятся отдельно, в build_jsonb_indexes(), после загрузки.
+
+        :param table: имя таблицы
+        :param records: список словарей, которые вставляются в таблицу
+        :param key_to_alias: оригинальный ключ и алиас
+        :param column_types: тип колонки в таблице (data_type из information_schema) по имени
+        """
+        table_profile = self.jsonb_profile.setdefault(table, {})
+        for key, alias in key_to_alias.items():
+            if column_types.get(alias) != "jsonb":
+                continue
+            column_profile = table_profile.setdefault(alias, {"rows": 0, "paths": {}})
+            for record in records:
+                value = record.get(key)
+                if not isinstance(value, dict):
+                    continue
+                column_profile["rows"] += 1
+                for path, item in iter_json_paths(value):
+                    path_stats = column_profile["paths"].setdefault(
+                        path, {"count": 0, "types": set(), "max_len": 0}
+                    )
+                    path_stats["count"] += 1
+                    path_stats["types"].add(determine_type(item))
+                    if isinstance(item, str):
+                        path_stats["max_len"] = max(path_stats["max_len"], len(item))
+
+    def register_jsonb_index(
+            self, cur, table: str, column: str, json_path: str, kind: str, index_name: str,
+            generated_column: str | None = None
+    ) -> None:
+        """
+        Записывает построенный индекс в контрольную таблицу JSONB_INDEX_TABLE.
+
+        :param cur: курсор текущей транзакции
+        :param table: имя таблицы
+        :param column: JSONB колонка
+        :param json_path: путь внутри JSONB в виде JSON-массива ('' для GIN по всей колонке)
+        :param kind: gin или btree
+        :param index_name: имя индекса
+        :param generated_column: имя generated колонки (для btree)
+        """
+        cur.execute(sql.SQL("""
+            INSERT INTO {registry}(table_name, column_name, json_path, kind, index_name, generated_column)
+            VALUES (%s,%s,%s,%s,%s,%s)
+            ON CONFLICT(table_name, column_name, json_path, kind) DO NOTHING
+        """).format(registry=sql.Identifier(JSONB_INDEX_TABLE)),
+            (table, column, json_path, kind, index_name, generated_column))
+        logger.info(f"Регистрирую индекс {index_name} в таблице {JSONB_INDEX_TABLE}")
+
+    def build_jsonb_indexes(self, table: str) -> int:
+        """
+        Строит индексы по накопленному профилю JSONB колонок таблицы.
+
+        Вызывается один раз после загрузки, а не на каждую запись:
+        1. Для каждой JSONB колонки — GIN индекс (jsonb_path_ops) для запросов вида `tags @> '["python"]'`.
+        2. Для "горячих" путей (встречаются не реже HOT_PATH_RATIO записей) — STORED generated колонка
+           `<колонка>__<путь>` с извлечённым значением и B-tree индекс по ней.
+           Числа и булевы значения приводятся к NUMERIC/BOOLEAN, если путь всегда одного jsonb типа
+           (целые и дробные числа — один тип number), иначе значение хранится как TEXT, обрезанный
+           до MAX_INDEXED_TEXT_LEN символов. Пути со строками длиннее MAX_INDEXED_TEXT_LEN не индексируются.
+           Все новые колонки добавляются одним ALTER TABLE (таблица переписывается один раз), всего у таблицы
+           не больше MAX_HOT_PATHS таких колонок — остаются самые частые пути.
+        3. Построенные индексы записываются в JSONB_INDEX_TABLE и при следующих запусках не пересоздаются.
+
+        :param table: имя таблицы
+        :return: количество новых индексов
+        """
+        table_profile = self.jsonb_profile.pop(table, {})
+        if not table_profile:
+            return 0
+
+        created = 0
+        table_sql = sql.Identifier(table)
+        with self.conn.cursor() as cur:
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {registry} (
+                    table_name TEXT NOT NULL,
+                    column_name TEXT NOT NULL,
+                    json_path TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    index_name TEXT NOT NULL,
+                    generated_column TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    PRIMARY KEY(table_name, column_name, json_path, kind)
+                )
+            """).format(registry=sql.Identifier(JSONB_INDEX_TABLE)))
+            logger.info(f"Создаю таблицу {JSONB_INDEX_TABLE} (если не существует)")
+
+            cur.execute(sql.SQL(
+                "SELECT column_name, json_path, kind, generated_column FROM {registry} WHERE table_name = %s"
+            ).format(registry=sql.Identifier(JSONB_INDEX_TABLE)), (table,))
+            registry_rows = cur.fetchall()
+            existing = {(column, json_path, kind) for column, json_path, kind, _ in registry_rows}
+            # имена, которые generated колонке брать нельзя: колонки таблицы, зарегистрированные
+            # и добавленные в этом запуске ("a__b" и ["a", "b"] дают одно и то же имя)
+            taken_names = set(self.get_columns(table)) | {row[3] for row in registry_rows if row[3]}
+            hot_slots = MAX_HOT_PATHS - sum(1 for _, _, kind in existing if kind == "btree")
+            hot_paths = []  # (доля записей, колонка, путь, json_path, статистика пути)
+
+            for column, column_profile in table_profile.items():
+                column_sql = sql.Identifier(column)
+                if (column, "", "gin") not in existing:
+                    index_name = generate_alias(f"ix_{table}_{column}_gin")
+                    cur.execute(sql.SQL(
+                        "CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN ({column} jsonb_path_ops)"
+                    ).format(index=sql.Identifier(index_name), table=table_sql, column=column_sql))
+                    logger.info(f"Создаю GIN индекс {index_name} по колонке {column}")
+                    self.register_jsonb_index(cur, table, column, "", "gin", index_name)
+                    created += 1
+
+                for path, path_stats in column_profile["paths"].items():
+                    json_path = json.dumps(list(path), ensure_ascii=False)
+                    if (column, json_path, "btree") in existing:
+                        continue
+                    ratio = path_stats["count"] / column_profile["rows"]
+                    if ratio >= HOT_PATH_RATIO:
+                        hot_paths.append((ratio, column, path, json_path, path_stats))
+
+            new_columns = []  # (колонка, путь, generated колонка, тип, выражение)
+            for _, column, path, json_path, path_stats in sorted(hot_paths, key=lambda item: item[0], reverse=True):
+                column_sql = sql.Identifier(column)
+                generated_column = generate_alias("__".join((column, *path)))
+                if generated_column in taken_names:
+                    logger.info(f"Пропускаю путь {json_path} колонки {column}: имя {generated_column}"
+                                f" уже занято колонкой таблицы или другим путём")
+                    continue
+                path_sql = sql.Literal(list(path))
+                # решаем по типу jsonb, а не determine_type: BIGINT и DOUBLE PRECISION — оба number
+                casts = {JSONB_SCALAR_CASTS.get(scalar_type) for scalar_type in path_stats["types"]}
+                cast = casts.pop() if len(casts) == 1 else None
+                if cast is not None:
+                    json_type, col_type = cast
+                    expression = sql.SQL(
+                        "CASE WHEN jsonb_typeof({column} #> {path}) = {json_type}"
+                        " THEN ({column} #>> {path})::{col_type} END"
+                    ).format(
+                        column=column_sql, path=path_sql,
+                        json_type=sql.Literal(json_type), col_type=sql.SQL(col_type)
+                    )
+                elif path_stats["max_len"] > MAX_INDEXED_TEXT_LEN:
+                    logger.info(f"Пропускаю путь {json_path} колонки {column}: строки длиннее"
+                                f" {MAX_INDEXED_TEXT_LEN} символов, это свободный текст")
+                    continue
+                else:
+                    # обрезка гарантирует, что будущие длинные значения не упрутся в лимит записи B-tree
+                    col_type = "TEXT"
+                    expression = sql.SQL("left({column} #>> {path}, {max_len})").format(
+                        column=column_sql, path=path_sql, max_len=sql.Literal(MAX_INDEXED_TEXT_LEN)
+                    )
+                if len(new_columns) >= hot_slots:
+                    logger.info(f"Пропускаю путь {json_path} колонки {column}: у таблицы {table}"
+                                f" уже {MAX_HOT_PATHS} generated колонок (MAX_HOT_PATHS)")
+                    continue
+                new_columns.append((column, json_path, generated_column, col_type, expression))
+                taken_names.add(generated_column)
+
+            if new_columns:
+                # один ALTER TABLE: добавление STORED колонок переписывает таблицу под ACCESS EXCLUSIVE
+                cur.execute(sql.SQL("ALTER TABLE {table} {add_columns}").format(
+                    table=table_sql,
+                    add_columns=sql.SQL(", ").join(
+                        sql.SQL(
+                            "ADD COLUMN IF NOT EXISTS {generated} {col_type} GENERATED ALWAYS AS ({expression}) STORED"
+                        ).format(
+                            generated=sql.Identifier(generated_column),
+                            col_type=sql.SQL(col_type), expression=expression
+                        )
+                        for _, _, generated_column, col_type, expression in new_columns
+                    )
+                ))
+                logger.info(f"Добавляю generated колонки {[item[2] for item in new_columns]}"
+                            f" в таблицу {table} одним ALTER TABLE")
+
+            for column, json_path, generated_column, col_type, _ in new_columns:
+                index_name = generate_alias(f"ix_{table}_{generated_column}")
+                cur.execute(sql.SQL(
+                    "CREATE INDEX IF NOT EXISTS {index} ON {table} ({generated})"
+                ).format(
+                    index=sql.Identifier(index_name), table=table_sql,
+                    generated=sql.Identifier(generated_column)
+                ))
+                logger.info(f"Создаю B-tree индекс {index_name} по колонке {generated_column} ({col_type})"
+                            f" для пути {json_path} колонки {column}")
+                self.register_jsonb_index(
+                    cur, table, column, json_path, "btree", index_name, generated_column
+                )
+                created += 1
+
+            if created:
+                cur.execute(sql.SQL("ANALYZE {table}").format(table=table_sql))
+                logger.info(f"Обновляю статистику планировщика для таблицы {table}")
+
+        return created
+
+    def get_columns(self, table: str) -> dict[str, tuple[str, bool]]:
+        """
+        Возвращает колонки таблицы с их типом и признаком того, что колонка generated.
+
+        :param table: имя таблицы
+        :return: словарь {имя колонки: (data_type, True, если колонка GENERATED ALWAYS)}
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT column_name, data_type, is_generated = 'ALWAYS'
+                FROM information_schema.columns
+                WHERE table_name = %s
+            """, (table,))
+            return {column: (data_type, generated) for column, data_type, generated in cur.fetchall()}
+
     def count_columns(self, table: str) -> int:
         """
         Возвращает количество колонок в указанной таблице.
@@ -261,6 +497,7 @@ class PgJsonUpserter:
             - inserted: количество вставленных записей (без первичного ключа)
             - updated: количество обновлённых записей (с существующим первичным ключом)
             - count_columns_after - columns_count_before: количество добавленных или изменённых колонок
+        :raises ValueError: если ключ записи совпадает с generated колонкой таблицы
         """
         inserted, updated, columns_count_before = 0, 0, self.count_columns(table)
         if not records:
@@ -271,6 +508,13 @@ class PgJsonUpserter:
 
         # получаем словари (key: alias, alias: type) и множество всех оригинальных ключей
         key_to_alias, alias_to_type, all_keys = self.generate_key_alias_mapping(records)
+
+        # ключ записи не должен совпадать с generated колонкой из build_jsonb_indexes: в неё нельзя писать
+        generated_columns = {column for column, (_, generated) in self.get_columns(table).items() if generated}
+        collisions = sorted(set(key_to_alias.values()) & generated_columns)
+        if collisions:
+            raise ValueError(f"Ключи {collisions} совпадают с generated колонками таблицы {table}")
+
         for key, alias in key_to_alias.items():
             col_type = alias_to_type[alias]
             self.alter_column(table, alias, col_type)
@@ -278,6 +522,11 @@ class PgJsonUpserter:
             if alias != key:
                 self.ensure_alias_mapping(table, key, alias)
 
+        if self.index_jsonb:
+            # профилируем по реальному типу колонки: если она уже была, скажем, TEXT, GIN по ней не построить
+            column_types = {column: data_type for column, (data_type, _) in self.get_columns(table).items()}
+            self.profile_jsonb(table, records, key_to_alias, column_types)
+
         # Подготовим значения для вставки
         added_cols, values_list = self.prepare_values(records, all_keys, key_to_alias)
 
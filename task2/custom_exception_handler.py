@@ -1,8 +1,172 @@
-import traceback
+import linecache
+import os
+import reprlib
+import threading
+import time
 import types
 import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Any, Callable
 
 MAX_REPR_LEN = 80  # максимальная длина строки при выводе локальных переменных
+FRAME_CACHE_SIZE = 4096  # максимальное количество кадров в общем кэше
+FILE_CHECK_INTERVAL = 1.0  # как часто (с) перепроверять, не изменился ли файл с исходником
+
+
+class FrameCache:
+    """
+    Общий для всех ExceptionReport кэш статической части кадров.
+
+    - Ключ — (code object, номер строки), значение — file, line, function, code
+    - Размер ограничен maxsize, при переполнении вытесняются давно не использованные кадры (LRU)
+    - При изменении исходного файла (mtime/размер) все его кадры выбрасываются, а строки
+      в linecache перечитываются; файл проверяется не чаще раза в check_interval секунд
+    """
+
+    def __init__(self, maxsize: int = FRAME_CACHE_SIZE, check_interval: float = FILE_CHECK_INTERVAL):
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._frames: OrderedDict[tuple[types.CodeType, int], dict] = OrderedDict()
+        self._stamps: dict[str, tuple[float, tuple | None]] = {}  # файл -> (время проверки, mtime и размер)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self._stamps.clear()
+            self.hits = self.misses = 0
+
+    def _check_file(self, filename: str) -> None:
+        """
+        Не чаще раза в check_interval сверяет mtime и размер файла с последними известными.
+
+        Если файл встретился впервые или изменился, его кадры выбрасываются, а строки в linecache
+        перечитываются — до поиска в кэше, чтобы и новые кадры не получили устаревший код.
+        """
+        now = time.monotonic()
+        checked_at, known = self._stamps.get(filename, (None, None))
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return
+        try:
+            stat = os.stat(filename)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:  # <stdin>, <string> и прочие кадры без файла
+            stamp = None
+        if checked_at is None:
+            linecache.checkcache(filename)
+        elif stamp != known:
+            self._invalidate(filename)
+        self._stamps[filename] = (now, stamp)
+
+    def _invalidate(self, filename: str) -> None:
+        for key in [key for key in self._frames if key[0].co_filename == filename]:
+            del self._frames[key]
+        linecache.checkcache(filename)
+
+    def get(self, frame: types.FrameType, lineno: int) -> dict:
+        """
+        Возвращает статическую часть кадра: file, line, function, code.
+
+        :param frame: кадр стека
+        :param lineno: номер строки, на которой кадр находился в момент исключения
+        :return: словарь, общий для всех отчётов — его нельзя изменять
+        """
+        code = frame.f_code
+        key = (code, lineno)
+        with self._lock:
+            self._check_file(code.co_filename)
+            cached = self._frames.get(key)
+            if cached is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return cached
+
+            self.misses += 1
+            linecache.lazycache(code.co_filename, frame.f_globals)
+            static = {
+                "file": code.co_filename,
+                "line": lineno,
+                "function": code.co_name,
+                "code": linecache.getline(code.co_filename, lineno).strip(),
+            }
+            self._frames[key] = static
+            if len(self._frames) > self.maxsize:
+                self._frames.popitem(last=False)
+            return static
+
+
+FRAME_CACHE = FrameCache()
+
+
+@dataclass(frozen=True)
+class CapturePolicy:
+    """
+    Политика захвата локальных переменных для ExceptionReport.
+
+    Кадры обходятся от самого глубокого к внешнему, поэтому при нехватке бюджета
+    локальные переменные остаются у кадров, ближайших к месту ошибки.
+
+    Атрибуты:
+        max_frames_with_locals (int | None): сколько самых глубоких кадров получают locals, None — все.
+        include_modules / exclude_modules (tuple[str, ...]): шаблоны fnmatch для имени модуля кадра.
+        include_names / exclude_names (tuple[str, ...]): шаблоны fnmatch для имён переменных.
+        renderers (dict[type, Callable]): свой рендер для типа (и его наследников) вместо ограниченного repr.
+        max_repr_len (int): максимальная длина строки одной переменной, ею же ограничивается reprlib.
+        time_budget (float | None): сколько секунд можно потратить на locals всего отчёта.
+        byte_budget (int | None): сколько символов locals можно набрать на весь отчёт.
+    """
+
+    max_frames_with_locals: int | None = None
+    include_modules: tuple[str, ...] = ()
+    exclude_modules: tuple[str, ...] = ()
+    include_names: tuple[str, ...] = ()
+    exclude_names: tuple[str, ...] = ("err",)
+    renderers: dict[type, Callable[[Any], str]] = field(default_factory=dict)
+    max_repr_len: int = MAX_REPR_LEN
+    time_budget: float | None = None
+    byte_budget: int | None = None
+    _repr: reprlib.Repr = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # reprlib не строит repr больших строк и коллекций целиком, в отличие от repr() с усечением
+        bounded = reprlib.Repr()
+        bounded.maxstring = bounded.maxlong = bounded.maxother = self.max_repr_len
+        object.__setattr__(self, "_repr", bounded)
+
+    def captures_module(self, module: str) -> bool:
+        if self.include_modules and not any(fnmatchcase(module, pattern) for pattern in self.include_modules):
+            return False
+        return not any(fnmatchcase(module, pattern) for pattern in self.exclude_modules)
+
+    def captures_name(self, name: str) -> bool:
+        if self.include_names and not any(fnmatchcase(name, pattern) for pattern in self.include_names):
+            return False
+        return not any(fnmatchcase(name, pattern) for pattern in self.exclude_names)
+
+    def render(self, value: Any) -> str:
+        """Приводит значение к строке через renderers (по MRO типа) или reprlib, результат усекается до max_repr_len"""
+        renderer = self._repr.repr
+        for cls in type(value).__mro__:
+            if cls in self.renderers:
+                renderer = self.renderers[cls]
+                break
+        try:
+            rendered = renderer(value)
+        except Exception as err:  # сломанный __repr__ не должен ронять отчёт об исключении
+            rendered = f"<repr failed: {err.__class__.__name__}>"
+        if len(rendered) > self.max_repr_len:
+            return rendered[:self.max_repr_len] + "..."
+        return rendered
+
+
+DEFAULT_POLICY = CapturePolicy()
 
 
 class ExceptionReport:
@@ -17,7 +181,8 @@ class ExceptionReport:
 
     __slots__ = ("_error_name", "_module_name", "_stack_trace")  # Допустимые атрибуты
 
-    def __init__(self, exc: BaseException):
+    def __init__(self, exc: BaseException, frame_cache: FrameCache = FRAME_CACHE,
+                 policy: CapturePolicy = DEFAULT_POLICY):
         """
         Инициализация нашего класса.
 
@@ -25,6 +190,8 @@ class ExceptionReport:
         - Извлекаем стек-трейс
 
         :param exc: BaseException базовый объект исключения
+        :param frame_cache: кэш статической части кадров, по умолчанию общий FRAME_CACHE
+        :param policy: политика захвата локальных переменных
         """
         self._error_name = f"{exc.__class__.__name__}: {exc}"
         tb = exc.__traceback__
@@ -33,7 +200,7 @@ class ExceptionReport:
             tb_frame = tb.tb_frame
             self._module_name = tb_frame.f_globals.get("__name__", "__main__")
 
-        self._stack_trace = self._extract_stack(tb=tb)
+        self._stack_trace = self._extract_stack(tb=tb, frame_cache=frame_cache, policy=policy)
 
     @property
     def error_name(self) -> str:
@@ -59,43 +226,63 @@ class ExceptionReport:
     def stack_trace(self, value):
         raise ValueError("Cannot set stack_trace")
 
-    def _extract_stack(self, tb: types.TracebackType) -> list[dict]:
+    def _extract_stack(self, tb: types.TracebackType, frame_cache: FrameCache,
+                       policy: CapturePolicy) -> list[dict]:
         """
         Извлекает стек трейс с локальными переменными.
 
         - Каждый кадр превращается в словарь с ключами file, line, function, code, locals.
-        - Локальные переменные приводятся к строкам с усечением длинных значений.
+        - file, line, function, code берутся из общего кэша кадров, заново считаются только locals.
+        - Кадры обходятся от самого глубокого; какие locals захватывать, решает policy.
+        - Если кадр вне max_frames_with_locals или бюджет по времени или объёму исчерпан, locals пустые,
+          а в кадре появляется ключ locals_omitted с причиной.
 
         :param tb: traceback объекта исключения
+        :param frame_cache: кэш статической части кадров
+        :param policy: политика захвата локальных переменных
         :return: список словарей с информацией о кадрах стека
         """
+        tracebacks = []
+        while tb is not None:
+            tracebacks.append(tb)
+            tb = tb.tb_next
+
         stack_trace = []
-        frame_summary = traceback.extract_tb(tb)
-        current_tb = tb
-
-        for frame in frame_summary:
-            locals_filtered = {}
-            if current_tb is not None:
-                locals_dict_copy = current_tb.tb_frame.f_locals.copy()
-                locals_dict_copy.pop("err", None)
-
-                for key, value in locals_dict_copy.items():
-                    repr_value = repr(value)
-                    if len(repr_value) > MAX_REPR_LEN:
-                        locals_filtered[key] = repr_value[:MAX_REPR_LEN] + "..."
-                    else:
-                        locals_filtered[key] = repr_value
-                current_tb = current_tb.tb_next
-
-            stack_trace.append({
-                "file": frame.filename,
-                "line": frame.lineno,
-                "function": frame.name,
-                "code": frame.line,
-                "locals": locals_filtered
-            })
-
-        stack_trace.reverse()
+        deadline = time.perf_counter() + policy.time_budget if policy.time_budget is not None else None
+        bytes_left = policy.byte_budget
+        omitted = None
+
+        for depth, current_tb in enumerate(reversed(tracebacks)):
+            frame = current_tb.tb_frame
+            frame_info = {**frame_cache.get(frame, current_tb.tb_lineno), "locals": {}}
+            stack_trace.append(frame_info)
+
+            if policy.max_frames_with_locals is not None and depth >= policy.max_frames_with_locals:
+                frame_info["locals_omitted"] = "max_frames_with_locals"
+                continue
+            if not policy.captures_module(frame.f_globals.get("__name__", "__main__")):
+                continue
+            if omitted:
+                frame_info["locals_omitted"] = omitted
+                continue
+
+            locals_filtered = frame_info["locals"]
+            for key, value in frame.f_locals.copy().items():
+                if not policy.captures_name(key):
+                    continue
+                if deadline is not None and time.perf_counter() > deadline:
+                    omitted = "time_budget"
+                elif bytes_left is not None and bytes_left <= 0:
+                    omitted = "byte_budget"
+                if omitted:
+                    frame_info["locals_omitted"] = omitted
+                    break
+
+                repr_value = policy.render(value)
+                locals_filtered[key] = repr_value
+                if bytes_left is not None:
+                    bytes_left -= len(key) + len(repr_value)
+
         return stack_trace
 
     def to_json(self, **kwargs) -> str:
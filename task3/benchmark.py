@@ -0,0 +1,208 @@
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import sysconfig
+import time
+from concurrent import futures
+from datetime import datetime, timezone
+from pathlib import Path
+from queue import Empty
+
+from worker_pool import ENGINES, check_chunk, split_even
+
+try:
+    import resource  # только Unix, на Windows пиковая память не замеряется
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = {
+    "process": futures.ProcessPoolExecutor,
+    "thread": futures.ThreadPoolExecutor,
+}
+if hasattr(futures, "InterpreterPoolExecutor"):  # Python 3.14+
+    EXECUTORS["interpreter"] = futures.InterpreterPoolExecutor
+
+CASE_TIMEOUT = 600.0  # сколько секунд ждать одну конфигурацию
+RESULT_POLL_INTERVAL = 1.0  # как часто проверять, жив ли процесс с конфигурацией
+KILL_TIMEOUT = 5.0  # сколько ждать завершения после terminate() перед kill()
+
+FIELDS = (
+    "timestamp", "python", "platform", "cpu_count", "free_threaded", "gil_enabled",
+    "executor", "engine", "workers", "chunk_size", "limit", "primes",
+    "startup", "startup_cpu", "wall", "cpu", "peak_rss_kb", "peak_rss_children_kb", "error",
+)
+
+
+def is_free_threaded() -> bool:
+    """Собран ли интерпретатор без GIL (free-threaded, PEP 703)"""
+    return bool(sysconfig.get_config_var("Py_GIL_DISABLED"))
+
+
+def is_gil_enabled() -> bool:
+    """Включен ли GIL в текущем процессе (на free-threaded сборке его можно вернуть через PYTHON_GIL=1)"""
+    return getattr(sys, "_is_gil_enabled", lambda: True)()
+
+
+def peak_rss_kb(children: bool = False) -> int | None:
+    """Пиковый RSS в КБ текущего процесса или самого «тяжёлого» из завершённых дочерних"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # на macOS ru_maxrss в байтах
+
+
+def run_case(executor: str, engine: str, workers: int, chunk_size: int, limit: int) -> dict:
+    """
+    Прогоняет одну конфигурацию и замеряет её стоимость.
+
+    - startup / startup_cpu: создание пула и выполнение по одной пустой задаче на воркер
+    - wall / cpu: проверка range(2, limit) чанками по chunk_size и остановка пула
+    - CPU — user + system процесса и его дочерних процессов. CPU дочерних процессов учитывается
+      только после их завершения, поэтому для process всё CPU воркеров попадает в cpu, а не в startup_cpu
+
+    :return: строка таблицы результатов
+    """
+    cpu_before = os.times()
+    started = time.perf_counter()
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        for warm_up in [pool.submit(os.getpid) for _ in range(workers)]:
+            warm_up.result()
+        startup = time.perf_counter() - started
+        cpu_startup = os.times()
+        chunks = split_even(2, limit, max(-(-(limit - 2) // chunk_size), 1))
+        tasks = [pool.submit(check_chunk, lo, hi, engine) for lo, hi in chunks]
+        primes = sum(len(task.result().primes) for task in tasks)
+    wall = time.perf_counter() - started - startup
+    cpu_after = os.times()
+
+    return {
+        "primes": primes,
+        "startup": startup,
+        "startup_cpu": sum(cpu_startup[:4]) - sum(cpu_before[:4]),
+        "wall": wall,
+        "cpu": sum(cpu_after[:4]) - sum(cpu_startup[:4]),
+        "peak_rss_kb": peak_rss_kb(),
+        "peak_rss_children_kb": peak_rss_kb(children=True),
+    }
+
+
+def _case_process(queue: multiprocessing.Queue, *case) -> None:
+    try:
+        queue.put(run_case(*case))
+    except Exception as err:
+        queue.put({"error": f"{err.__class__.__name__}: {err}"})
+
+
+def run_isolated(*case, timeout: float = CASE_TIMEOUT) -> dict:
+    """
+    Запускает run_case в отдельном процессе, чтобы пиковая память и CPU не копились между прогонами.
+
+    Если процесс умер, не вернув результат (OOM, падение в субинтерпретаторе), или не уложился
+    в timeout, возвращается строка с error, а матрица продолжается. Зависший процесс получает
+    terminate(), а если не завершился за KILL_TIMEOUT — kill().
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_case_process, args=(queue, *case))
+    process.start()
+    deadline = time.perf_counter() + timeout
+    result = None
+
+    while result is None:
+        try:
+            result = queue.get(timeout=RESULT_POLL_INTERVAL)
+        except Empty:
+            if not process.is_alive():
+                try:  # результат мог попасть в очередь прямо перед выходом
+                    result = queue.get(timeout=RESULT_POLL_INTERVAL)
+                except Empty:
+                    result = {"error": f"процесс завершился без результата, код {process.exitcode}"}
+            elif time.perf_counter() > deadline:
+                process.terminate()
+                result = {"error": f"превышен таймаут {timeout:.0f} с"}
+
+    process.join(KILL_TIMEOUT)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    return result
+
+
+def write_results(rows: list[dict], json_path: Path | None, csv_path: Path | None) -> None:
+    """Дописывает результаты в JSON (список строк) и CSV, чтобы можно было следить за динамикой"""
+    if json_path:
+        history = json.loads(json_path.read_text(encoding="utf-8")) if json_path.exists() else []
+        json_path.write_text(json.dumps(history + rows, indent=2), encoding="utf-8")
+        logger.info(f"Результаты добавлены в {json_path}")
+    if csv_path:
+        new_file = not csv_path.exists()
+        with csv_path.open(mode="a", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+        logger.info(f"Результаты добавлены в {csv_path}")
+
+
+def parse_ints(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Матрица бенчмарков worker_pool по исполнителям")
+    parser.add_argument("--limit", type=int, default=200000)
+    parser.add_argument("--workers", type=parse_ints, default=[1, 2, 4], help="список через запятую")
+    parser.add_argument("--chunk-sizes", type=parse_ints, default=[1000, 10000], help="список через запятую")
+    parser.add_argument("--executors", default=",".join(EXECUTORS), help="список через запятую")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="список через запятую")
+    parser.add_argument("--json", type=Path, help="файл с историей результатов в JSON")
+    parser.add_argument("--csv", type=Path, help="файл с историей результатов в CSV")
+    parser.add_argument("--case-timeout", type=float, default=CASE_TIMEOUT, help="таймаут одной конфигурации, с")
+    args = parser.parse_args()
+
+    executors = [name for name in args.executors.split(",") if name in EXECUTORS]
+    engines = [name for name in args.engines.split(",") if name in ENGINES]
+    environment = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "free_threaded": is_free_threaded(),
+        "gil_enabled": is_gil_enabled(),
+    }
+    logger.info(
+        f"Python {environment['python']}, free-threaded: {environment['free_threaded']}, "
+        f"исполнители: {', '.join(executors)}, движки: {', '.join(engines)}"
+    )
+
+    rows = []
+    for executor in executors:
+        for engine in engines:
+            for workers in args.workers:
+                for chunk_size in args.chunk_sizes:
+                    case = {
+                        "executor": executor, "engine": engine, "workers": workers,
+                        "chunk_size": chunk_size, "limit": args.limit,
+                    }
+                    row = {**environment, **case, **run_isolated(*case.values(), timeout=args.case_timeout)}
+                    rows.append(row)
+                    if "error" in row:
+                        logger.error(f"{executor}/{engine} w={workers} chunk={chunk_size}: {row['error']}")
+                        continue
+                    logger.info(
+                        f"{executor}/{engine} w={workers} chunk={chunk_size}: "
+                        f"старт {row['startup']:.3f} с (CPU {row['startup_cpu']:.3f} с), счёт {row['wall']:.3f} с, CPU {row['cpu']:.3f} с, "
+                        f"пик RSS {row['peak_rss_kb']}/{row['peak_rss_children_kb']} КБ"
+                    )
+
+    write_results(rows, args.json, args.csv)
+
+
+if __name__ == "__main__":
+    main()
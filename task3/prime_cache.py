@@ -0,0 +1,185 @@
+import logging
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PRIMEBMP"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")  # magic, версия, резерв, limit: покрыты числа [0, limit)
+LIMIT_OFFSET = HEADER.size - 8
+
+# Для каждого байта битовой карты — номера установленных в нём битов
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+
+@contextmanager
+def exclusive_lock(path: Path) -> Iterator[None]:
+    """
+    Межпроцессная эксклюзивная блокировка на отдельном .lock файле.
+
+    Отдельный файл нужен, чтобы на Windows блокировка не мешала читать сам кэш.
+    """
+    with path.open(mode="a+b") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class PrimeCache:
+    """
+    Кэш простых чисел на диске: битовая карта, бит n установлен, если n простое.
+
+    - Файл отображается в память (mmap), запросы ниже покрытого limit отвечаются без вычислений
+    - extend() дописывает только недостающий диапазон под межпроцессной блокировкой
+    - Заголовок с новым limit пишется последним, после сброса данных на диск, поэтому читатели
+      никогда не видят непокрытые биты, а оборванная запись просто не учитывается
+
+    Использование:
+        with PrimeCache(Path("primes.bin")) as cache:
+            if n < cache.limit:
+                cache.is_prime(n)
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._file = None
+        self._map: mmap.mmap | None = None
+
+    def __enter__(self) -> "PrimeCache":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        with exclusive_lock(self.lock_path):
+            if not self.path.exists() or self.path.stat().st_size < HEADER.size:
+                with self.path.open(mode="wb") as file:
+                    file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+                    file.flush()
+                    os.fsync(file.fileno())
+        self._file = self.path.open(mode="r+b")
+        self._remap()
+        magic, version, _, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{self.path} не является кэшем простых чисел версии {VERSION}")
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _remap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    @property
+    def limit(self) -> int:
+        """Граница покрытого диапазона: для всех n < limit ответ уже лежит в кэше"""
+        return struct.unpack_from("<Q", self._map, LIMIT_OFFSET)[0]
+
+    def _view(self, stop: int) -> memoryview:
+        """Битовая карта чисел [0, stop) без копирования, при необходимости перечитывает выросший файл"""
+        size = HEADER.size + (stop + 7) // 8
+        if len(self._map) < size:
+            self._remap()
+        return memoryview(self._map)[HEADER.size:size]
+
+    def _check(self, stop: int) -> None:
+        if stop > self.limit:
+            raise ValueError(f"Кэш покрывает числа до {self.limit}, запрошено до {stop}")
+
+    def is_prime(self, num: int) -> bool:
+        self._check(num + 1)
+        return bool(self._view(num + 1)[num // 8] >> (num % 8) & 1)
+
+    def count(self, stop: int) -> int:
+        """Количество простых в [0, stop)"""
+        self._check(stop)
+        if stop <= 0:
+            return 0
+        view = self._view(stop)
+        tail = stop % 8
+        full = view[: stop // 8]
+        total = int.from_bytes(full, "little").bit_count()
+        if tail:
+            total += (view[stop // 8] & ((1 << tail) - 1)).bit_count()
+        return total
+
+    def primes(self, start: int, stop: int) -> list[int]:
+        """Простые числа из [start, stop)"""
+        self._check(stop)
+        view = self._view(stop)
+        result = []
+        for index in range(start // 8, (stop + 7) // 8):
+            byte = view[index]
+            if byte:
+                base = index * 8
+                result.extend(base + bit for bit in BYTE_BITS[byte] if start <= base + bit < stop)
+        return result
+
+    def extend(self, limit: int, primes: Iterable[int]) -> int:
+        """
+        Дописывает результаты до limit.
+
+        primes должны содержать все простые из [self.limit, limit): если другой процесс
+        уже покрыл часть диапазона, лишние биты просто совпадут с записанными.
+
+        :param limit: новая граница покрытого диапазона
+        :param primes: простые числа недостающего диапазона
+        :return: граница покрытого диапазона после записи
+        """
+        with exclusive_lock(self.lock_path):
+            covered = self.limit
+            if limit <= covered:
+                return covered
+
+            size = HEADER.size + (limit + 7) // 8
+            if os.fstat(self._file.fileno()).st_size < size:
+                self._map.close()  # на Windows нельзя менять размер отображённого файла
+                self._map = None
+                self._file.truncate(size)
+            self._remap()
+
+            first = covered // 8
+            region = bytearray((limit + 7) // 8 - first)
+            region[0] = self._map[HEADER.size + first] & ((1 << covered % 8) - 1)  # биты ниже covered не трогаем
+            for num in primes:
+                if covered <= num < limit:
+                    region[num // 8 - first] |= 1 << num % 8
+            self._map[HEADER.size + first:size] = region
+            self._map.flush()
+
+            struct.pack_into("<Q", self._map, LIMIT_OFFSET, limit)
+            self._map.flush()
+
+        logger.info(f"Кэш {self.path} расширен с {covered} до {limit}")
+        return limit
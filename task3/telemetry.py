@@ -0,0 +1,199 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержек в секундах (последняя корзина — всё, что больше)
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с фиксированными корзинами.
+
+    Запись стоит O(log n) по числу корзин и не хранит сами значения, поэтому
+    её можно держать включённой на полной пропускной способности.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        lo, hi = 0, len(self.buckets)
+        while lo < hi:  # бинарный поиск первой корзины, в которую помещается значение
+            mid = (lo + hi) // 2
+            if value <= self.buckets[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        self.counts[lo] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля сверху: граница корзины, в которую попадает q-я доля значений"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": {
+                **{f"<={bound}": count for bound, count in zip(self.buckets, self.counts)},
+                f">{self.buckets[-1]}": self.counts[-1],
+            },
+        }
+
+
+@dataclass
+class WorkerCounters:
+    """Счётчики одного процесса-воркера, собираются из результатов чанков"""
+
+    numbers: int = 0
+    chunks: int = 0
+    busy: float = 0.0  # суммарное время счёта внутри воркера, с
+
+    @property
+    def rate(self) -> float:
+        return self.numbers / self.busy if self.busy else 0.0
+
+
+class Telemetry:
+    """
+    Телеметрия пула: счётчики, скорость в скользящем окне, гистограммы задержек.
+
+    - submitted/completed считаются в основном процессе при отправке и сборе чанков
+    - в полёте (in_flight) — не больше workers незавершённых чанков, остальные считаются очередью
+    - счётчики воркеров приходят вместе с результатом чанка (pid, размер, время счёта)
+    """
+
+    def __init__(self, workers: int, window: float = 10.0):
+        self.workers = workers
+        self.window = window
+        self.started = time.perf_counter()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.processed = 0
+        self.per_worker: dict[int, WorkerCounters] = {}
+        self.latency = LatencyHistogram()  # от submit() до получения результата
+        self.service_time = LatencyHistogram()  # время счёта чанка внутри воркера
+        self._samples: deque[tuple[float, int]] = deque([(self.started, 0)])
+        self._lock = threading.Lock()
+
+    @property
+    def outstanding(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    @property
+    def in_flight(self) -> int:
+        return min(self.outstanding, self.workers)
+
+    @property
+    def queue_depth(self) -> int:
+        return self.outstanding - self.in_flight
+
+    def on_submit(self) -> None:
+        with self._lock:
+            self.submitted += 1
+
+    def on_failed(self) -> None:
+        with self._lock:
+            self.failed += 1
+
+    def on_done(self, worker: int, numbers: int, duration: float, latency: float) -> None:
+        with self._lock:
+            self.completed += 1
+            self.processed += numbers
+            counters = self.per_worker.setdefault(worker, WorkerCounters())
+            counters.numbers += numbers
+            counters.chunks += 1
+            counters.busy += duration
+            self.latency.record(latency)
+            self.service_time.record(duration)
+
+    def rate(self) -> float:
+        """Скорость (чисел/с) в скользящем окне последних window секунд"""
+        now = time.perf_counter()
+        with self._lock:
+            self._samples.append((now, self.processed))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+                self._samples.popleft()
+            first_time, first_processed = self._samples[0]
+            processed = self.processed
+        return (processed - first_processed) / (now - first_time) if now > first_time else 0.0
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            return {
+                "elapsed": elapsed,
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "processed": self.processed,
+                "throughput": self.processed / elapsed if elapsed else 0.0,
+                "per_worker": {
+                    str(pid): {**asdict(counters), "rate": counters.rate}
+                    for pid, counters in sorted(self.per_worker.items())
+                },
+                "latency": self.latency.to_dict(),
+                "service_time": self.service_time.to_dict(),
+            }
+
+    def write_json(self, path: Path) -> None:
+        """Сохраняет итоговую сводку в JSON"""
+        path.write_text(json.dumps(self.summary(), indent=2), encoding="utf-8")
+        logger.info(f"Сводка телеметрии сохранена в {path}")
+
+
+class ProgressReporter(threading.Thread):
+    """Фоновый поток, раз в interval секунд логирующий прогресс пула"""
+
+    def __init__(self, telemetry: Telemetry, interval: float = 5.0):
+        super().__init__(name="ProgressReporter", daemon=True)
+        self.telemetry = telemetry
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def report(self) -> None:
+        t = self.telemetry
+        per_worker = ", ".join(
+            f"{pid}: {counters.rate:.0f}/с" for pid, counters in sorted(t.per_worker.copy().items())
+        )
+        logger.info(
+            f"Прогресс: {t.processed} чисел, {t.rate():.2f} чисел/с за {t.window:.0f} с, "
+            f"в работе: {t.in_flight}, в очереди: {t.queue_depth}, "
+            f"p50/p99 задержки: {t.latency.percentile(0.5):.3f}/{t.latency.percentile(0.99):.3f} с"
+            + (f" | воркеры: {per_worker}" if per_worker else "")
+        )
+
+    def stop(self) -> None:
+        self._stopped.set()
@@ -1,8 +1,19 @@
 import argparse
+import json
+import os
+import sys
 import time
 import logging
+import math
 import signal
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence, TextIO
+
+from prime_cache import PrimeCache
+from telemetry import ProgressReporter, Telemetry
 
 
 logging.basicConfig(
@@ -14,6 +25,18 @@ logger = logging.getLogger(__name__)
 
 stop = False
 
+SCHEDULES = ("static", "cost", "guided")
+CHUNKS_PER_WORKER = 8  # сколько чанков на воркер нарезаем в static/cost режимах
+MIN_CHUNK_SECONDS = 0.005  # минимальная длительность чанка в guided режиме, чтобы не утонуть в накладных расходах
+MIN_CHUNK_SIZE = 16
+BATCH_SIZE = 10000  # сколько чисел из потока уходит в воркер за раз
+
+# Простые до 100 для предварительного отсева в Miller–Rabin
+SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97)
+# Основания, при которых Miller–Rabin детерминирован для n < MILLER_RABIN_LIMIT (с запасом покрывает 2^64)
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+MILLER_RABIN_LIMIT = 318665857834031151167461  # наименьшее составное, проходящее все MILLER_RABIN_BASES
+
 
 def handle_signal(signum, frame):
     global stop
@@ -21,55 +44,475 @@ def handle_signal(signum, frame):
     stop = True
 
 
-signal.signal(signal.SIGINT, handle_signal)
-signal.signal(signal.SIGTERM, handle_signal)
-
-
 def is_prime(num: int) -> bool:
     """Простая проверка числа на простоту"""  # Взял отсюда: https://stackoverflow.com/a/15285588
+    if num < 2:
+        return False
     if num == 2:
         return True
     if num % 2 == 0:
         return False
-    for i in range(3, int(num**0.5) + 1, 2):
+    for i in range(3, math.isqrt(num) + 1, 2):
         if num % i == 0:
             return False
     return True
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--workers", type=int, default=4)
-    parser.add_argument("--limit", type=int, default=50000)
-    args = parser.parse_args()
+def is_prime_miller_rabin(num: int) -> bool:
+    """
+    Тест Миллера–Рабина: детерминированный для n < MILLER_RABIN_LIMIT (≈3.18 * 10^23, все 64-битные числа),
+    для больших n ответ вероятностный — такие числа отсекает read_numbers, если это не разрешено явно.
 
-    numbers = args.limit
-    max_workers = args.workers
+    - Сначала отсев делением на простые до 100
+    - Затем n - 1 = d * 2^s и проверка по основаниям MILLER_RABIN_BASES через pow(a, d, n)
 
-    start = time.perf_counter()
+    Стоимость O(k * log^3 n) — микросекунды на число независимо от величины.
+    """
+    if num < 2:
+        return False
+    for p in SMALL_PRIMES:
+        if num % p == 0:
+            return num == p
+
+    d, s = num - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, num)
+        if x == 1 or x == num - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % num
+            if x == num - 1:
+                break
+        else:
+            return False
+    return True
+
+
+ENGINES = {
+    "trial": is_prime,
+    "miller_rabin": is_prime_miller_rabin,
+}
+
+
+@dataclass
+class ChunkResult:
+    """Результат проверки одного чанка, возвращается из процесса-воркера"""
+
+    checked: int  # сколько чисел проверено
+    primes: list[int]
+    worker: int  # pid процесса, который считал чанк
+    duration: float  # время счёта внутри воркера, с
+    failed: int = 0  # сколько чисел не удалось проверить
+
+
+@dataclass
+class PoolStats:
+    """Итоги прогона пула: пропускная способность и загрузка воркеров"""
+
+    schedule: str
+    checked: int = 0
+    found: int = 0
+    primes: list[int] = field(default_factory=list)  # в потоковом режиме не копятся, а сразу пишутся в вывод
+    elapsed: float = 0.0
+    busy: dict[int, float] = field(default_factory=dict)  # pid -> суммарное время счёта
+    last_done: dict[int, float] = field(default_factory=dict)  # pid -> момент сдачи последнего чанка
+    chunks: int = 0
+    failed: int = 0  # числа, на которых проверка упала
+
+    @property
+    def tail(self) -> float:
+        """Хвост: сколько длился прогон после того, как первый воркер остался без работы"""
+        if not self.last_done:
+            return 0.0
+        return self.elapsed - min(self.last_done.values())
+
+    def utilization(self) -> dict[int, float]:
+        """Доля времени прогона, которую каждый воркер был занят счётом"""
+        if not self.elapsed:
+            return {}
+        return {pid: busy / self.elapsed for pid, busy in self.busy.items()}
+
+
+def check_numbers(numbers: Sequence[int], engine: str = "trial") -> ChunkResult:
+    """
+    Проверяет на простоту переданные числа внутри воркера.
+
+    :param numbers: числа для проверки (диапазон или пачка из потока)
+    :param engine: имя проверки из ENGINES
+    :return: ChunkResult с найденными простыми (в исходном порядке) и временем счёта
+    """
+    check = ENGINES[engine]
+    started = time.perf_counter()
+    primes = []
+    failed = 0
+    for num in numbers:  # ошибка на одном числе не должна терять всю пачку
+        try:
+            if check(num):
+                primes.append(num)
+        except Exception as err:
+            logger.error(f"Не удалось проверить число {num}: {err.__class__.__name__}: {err}")
+            failed += 1
+    return ChunkResult(len(numbers), primes, os.getpid(), time.perf_counter() - started, failed)
+
+
+def check_chunk(start: int, stop: int, engine: str = "trial") -> ChunkResult:
+    """
+    Проверяет на простоту все числа диапазона [start, stop) внутри воркера.
+
+    :param start: начало диапазона (включительно)
+    :param stop: конец диапазона (не включительно)
+    :param engine: имя проверки из ENGINES
+    :return: ChunkResult с найденными простыми и временем счёта
+    """
+    return check_numbers(range(start, stop), engine)
+
+
+def estimate_cost(start: int, stop: int) -> float:
+    """
+    Оценка стоимости проверки диапазона [start, stop) пробным делением.
+
+    Проверка числа n стоит до sqrt(n) делений, поэтому стоимость диапазона
+    приближается интегралом sqrt(x) dx = 2/3 * (stop^1.5 - start^1.5).
+    """
+    return 2 / 3 * (stop**1.5 - start**1.5)
+
+
+def cost_to_stop(start: int, cost: float) -> int:
+    """Обратная к estimate_cost: где закончится диапазон от start с заданной стоимостью"""
+    return int((start**1.5 + 1.5 * cost) ** (2 / 3))
+
+
+def split_even(start: int, stop: int, parts: int) -> list[tuple[int, int]]:
+    """Режет [start, stop) на parts диапазонов одинаковой длины"""
+    size = max(-(-(stop - start) // parts), 1)
+    return [(lo, min(lo + size, stop)) for lo in range(start, stop, size)]
+
+
+def split_by_cost(start: int, stop: int, parts: int) -> list[tuple[int, int]]:
+    """Режет [start, stop) на parts диапазонов одинаковой оценочной стоимости: верхние диапазоны получаются короче"""
+    part_cost = estimate_cost(start, stop) / parts
+    bounds = sorted({start, stop, *(min(cost_to_stop(start, i * part_cost), stop) for i in range(1, parts))})
+    return list(zip(bounds, bounds[1:]))
 
-    results = []
-    logger.info(f"Запуск {args.workers} процессов")
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(is_prime, n): n for n in range(2, numbers)}
+def submit(executor: ProcessPoolExecutor, telemetry: Telemetry, fn, *args) -> tuple[Future, float]:
+    """Отправляет чанк в пул, возвращает future и момент отправки для подсчёта задержки"""
+    future = executor.submit(fn, *args)
+    telemetry.on_submit()
+    return future, time.perf_counter()
 
-        for future in as_completed(futures):
-            number = futures[future]
+
+def collect(stats: PoolStats, future: Future, submitted_at: float, start_time: float,
+            telemetry: Telemetry) -> ChunkResult | None:
+    """Забирает результат чанка и обновляет статистику прогона и телеметрию, при ошибке возвращает None"""
+    try:
+        chunk = future.result()
+    except Exception as err:
+        logger.error(f"Ошибка при обработке чанка: {err}")
+        telemetry.on_failed()
+        return None
+    telemetry.on_done(chunk.worker, chunk.checked, chunk.duration, time.perf_counter() - submitted_at)
+    stats.checked += chunk.checked
+    stats.found += len(chunk.primes)
+    stats.failed += chunk.failed
+    stats.chunks += 1
+    stats.busy[chunk.worker] = stats.busy.get(chunk.worker, 0.0) + chunk.duration
+    stats.last_done[chunk.worker] = time.perf_counter() - start_time
+    return chunk
+
+
+def run_static(executor: ProcessPoolExecutor, chunks: list[tuple[int, int]], engine: str, stats: PoolStats,
+               start_time: float, telemetry: Telemetry):
+    """Отправляет все чанки разом и ждёт их завершения"""
+    pending: dict[Future, float] = dict(submit(executor, telemetry, check_chunk, lo, hi, engine) for lo, hi in chunks)
+    while pending and not stop:
+        done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for future in done:
+            if chunk := collect(stats, future, pending.pop(future), start_time, telemetry):
+                stats.primes.extend(chunk.primes)
+    for future in pending:
+        future.cancel()
+
+
+def run_guided(executor: ProcessPoolExecutor, start: int, stop_at: int, workers: int, engine: str,
+               stats: PoolStats, start_time: float, telemetry: Telemetry):
+    """
+    Guided-планирование по стоимости.
+
+    - Очередной чанк берёт 1/(2*workers) от оставшейся оценочной стоимости, поэтому чанки
+      к концу прогона мельчают и хвост выравнивается.
+    - Нижняя граница чанка подстраивается по измеренной скорости (единиц стоимости в секунду),
+      чтобы чанк длился не меньше MIN_CHUNK_SECONDS.
+    - В полёте держится 2*workers чанков, новый чанк отправляется по мере освобождения воркера.
+    """
+    next_start = start
+    min_cost = estimate_cost(start, min(start + MIN_CHUNK_SIZE, stop_at))
+    measured_cost = 0.0
+    measured_time = 0.0
+    pending: dict[Future, tuple[float, float]] = {}  # future -> (оценка стоимости, момент отправки)
+
+    while (next_start < stop_at or pending) and not stop:
+        while next_start < stop_at and len(pending) < 2 * workers:
+            chunk_cost = max(estimate_cost(next_start, stop_at) / (2 * workers), min_cost)
+            hi = min(max(cost_to_stop(next_start, chunk_cost), next_start + MIN_CHUNK_SIZE), stop_at)
+            future, submitted_at = submit(executor, telemetry, check_chunk, next_start, hi, engine)
+            pending[future] = estimate_cost(next_start, hi), submitted_at
+            next_start = hi
+
+        done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk_cost, submitted_at = pending.pop(future)
+            if chunk := collect(stats, future, submitted_at, start_time, telemetry):
+                stats.primes.extend(chunk.primes)
+                measured_cost += chunk_cost
+                measured_time += chunk.duration
+        if measured_time:
+            min_cost = measured_cost / measured_time * MIN_CHUNK_SECONDS
+
+    for future in pending:
+        future.cancel()
+
+
+def run_pool(limit: int, workers: int, schedule: str = "guided", telemetry: Telemetry | None = None,
+             progress_interval: float = 0.0, start: int = 2, engine: str = "trial") -> PoolStats:
+    """
+    Проверяет числа из range(start, limit) на простоту в пуле процессов.
+
+    :param limit: верхняя граница диапазона (не включительно)
+    :param workers: количество процессов
+    :param schedule: режим планирования из SCHEDULES
+    :param telemetry: куда собирать телеметрию (по умолчанию создаётся новая)
+    :param progress_interval: период логирования прогресса в секундах, 0 — не логировать
+    :param start: нижняя граница диапазона (включительно)
+    :param engine: имя проверки из ENGINES
+    :return: PoolStats со статистикой прогона
+    """
+    stats = PoolStats(schedule=schedule)
+    telemetry = telemetry or Telemetry(workers)
+    reporter = ProgressReporter(telemetry, progress_interval) if progress_interval > 0 else None
+    start_time = time.perf_counter()
+
+    if reporter:
+        reporter.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if schedule == "static":
+                chunks = split_even(start, limit, workers * CHUNKS_PER_WORKER)
+                run_static(executor, chunks, engine, stats, start_time, telemetry)
+            elif schedule == "cost":
+                chunks = split_by_cost(start, limit, workers * CHUNKS_PER_WORKER)
+                run_static(executor, chunks, engine, stats, start_time, telemetry)
+            else:
+                run_guided(executor, start, limit, workers, engine, stats, start_time, telemetry)
+    finally:
+        if reporter:
+            reporter.stop()
+
+    stats.elapsed = time.perf_counter() - start_time
+    return stats
+
+
+def read_numbers(stream: TextIO, max_value: int | None = None) -> Iterator[int]:
+    """
+    Читает целые числа из потока: по одному или несколько через пробел в строке, мусор пропускается.
+
+    :param stream: входной поток
+    :param max_value: числа не меньше этого значения пропускаются с ошибкой в логе, None — без ограничения
+    :return: итератор чисел
+    """
+    for line_no, line in enumerate(stream, start=1):
+        for token in line.split():
             try:
-                result = future.result(timeout=2)
-                results.append((number, result))
-            except Exception as err:
-                logger.error(f"Ошибка при обработке {number}: {err}")
+                num = int(token)
+            except ValueError:
+                logger.error(f"Строка {line_no}: пропускаю не число {token!r}")
+                continue
+            if max_value is not None and num >= max_value:
+                logger.error(f"Строка {line_no}: пропускаю {num}, для него нет гарантированного ответа")
+                continue
+            yield num
+
+
+def run_stream(numbers: Iterable[int], workers: int, output: TextIO, engine: str = "miller_rabin",
+               telemetry: Telemetry | None = None, progress_interval: float = 0.0,
+               batch_size: int = BATCH_SIZE) -> PoolStats:
+    """
+    Проверяет на простоту произвольные числа из потока вместо range(2, limit).
+
+    - Поток читается пачками по batch_size, в полёте не больше 2*workers пачек, поэтому память не растёт
+    - Простые пишутся в output по одному на строку в порядке входа: готовая пачка ждёт, пока допишутся предыдущие
+
+    :param numbers: числа для проверки
+    :param workers: количество процессов
+    :param output: куда писать найденные простые
+    :param engine: имя проверки из ENGINES
+    :param telemetry: куда собирать телеметрию (по умолчанию создаётся новая)
+    :param progress_interval: период логирования прогресса в секундах, 0 — не логировать
+    :param batch_size: сколько чисел отправлять в воркер за раз
+    :return: PoolStats со статистикой прогона
+    """
+    stats = PoolStats(schedule="stream")
+    telemetry = telemetry or Telemetry(workers)
+    reporter = ProgressReporter(telemetry, progress_interval) if progress_interval > 0 else None
+    start_time = time.perf_counter()
+    numbers = iter(numbers)
+    pending: dict[Future, tuple[int, float]] = {}  # future -> (номер пачки, момент отправки)
+    ready: dict[int, list[int]] = {}  # посчитанные пачки, ожидающие вывода
+    submitted = written = 0
+    exhausted = False
 
-    end = time.perf_counter() - start
-    throughput = len(results) / end
+    if reporter:
+        reporter.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while (not exhausted or pending) and not stop:
+                while not exhausted and len(pending) < 2 * workers:
+                    batch = list(islice(numbers, batch_size))
+                    if not batch:
+                        exhausted = True
+                        break
+                    future, submitted_at = submit(executor, telemetry, check_numbers, batch, engine)
+                    pending[future] = submitted, submitted_at
+                    submitted += 1
+                if not pending:
+                    break
 
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, submitted_at = pending.pop(future)
+                    chunk = collect(stats, future, submitted_at, start_time, telemetry)
+                    ready[index] = chunk.primes if chunk else []
+                while written in ready:
+                    output.writelines(f"{prime}\n" for prime in ready.pop(written))
+                    written += 1
+
+            for future in pending:
+                future.cancel()
+    finally:
+        if reporter:
+            reporter.stop()
+        output.flush()
+
+    stats.elapsed = time.perf_counter() - start_time
+    return stats
+
+
+def log_stats(stats: PoolStats, verbose: bool = False) -> None:
+    """Логирует итоги прогона, при verbose — ещё и загрузку каждого воркера"""
+    throughput = stats.checked / stats.elapsed if stats.elapsed else 0.0
     logger.info(
-        f"Завершено: {len(results)} чисел за {end:.2f} с "
-        f"({throughput:.2f} чисел/с)"
+        f"[{stats.schedule}] Завершено: {stats.checked} чисел за {stats.elapsed:.2f} с "
+        f"({throughput:.2f} чисел/с), простых: {stats.found}, чанков: {stats.chunks}, хвост: {stats.tail:.3f} с"
     )
+    if stats.failed:
+        logger.warning(f"[{stats.schedule}] Не удалось проверить чисел: {stats.failed}, они пропущены")
+    if verbose:
+        for pid, share in sorted(stats.utilization().items()):
+            logger.info(f"[{stats.schedule}]   воркер {pid}: загрузка {share:.1%}")
+
+
+def run_cached(path: Path, limit: int, workers: int, schedule: str, telemetry: Telemetry,
+               progress_interval: float, engine: str = "trial") -> None:
+    """
+    Прогон поверх кэша: ниже покрытой границы ответ берётся из кэша, в пул уходит только недостающий диапазон.
+
+    Результат дописывается в кэш, только если диапазон посчитан целиком (не было остановки или ошибок).
+    """
+    with PrimeCache(path) as cache:
+        covered = cache.limit
+        if limit <= covered:
+            logger.info(f"Ответ из кэша {path}: простых меньше {limit}: {cache.count(limit)}")
+            return
+
+        start = max(covered, 2)
+        logger.info(f"Кэш покрывает числа до {covered}, досчитываю [{start}, {limit})")
+        stats = run_pool(limit, workers, schedule, telemetry, progress_interval, start=start, engine=engine)
+        log_stats(stats)
+        if stats.checked != limit - start:
+            logger.warning("Диапазон посчитан не полностью, кэш не обновляю")
+            return
+        cache.extend(limit, stats.primes)
+        logger.info(f"Простых меньше {limit}: {cache.count(limit)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=50000)
+    parser.add_argument("--schedule", choices=SCHEDULES, default="guided")
+    parser.add_argument("--compare", action="store_true", help="прогнать все режимы планирования и сравнить")
+    parser.add_argument("--progress", type=float, default=5.0, help="период логирования прогресса, с (0 — выкл.)")
+    parser.add_argument("--stats-json", type=Path, help="куда сохранить JSON-сводку телеметрии при выходе")
+    parser.add_argument("--cache", type=Path, help="файл кэша простых чисел, досчитывается только недостающее")
+    parser.add_argument("--engine", choices=ENGINES, default=None,
+                        help="проверка на простоту (по умолчанию trial для диапазона, miller_rabin для --input)")
+    parser.add_argument("--input", help="файл с произвольными целыми числами вместо range(2, limit), '-' — stdin")
+    parser.add_argument("--output", type=Path, help="куда писать простые из --input (по умолчанию stdout)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="размер пачки чисел из --input")
+    parser.add_argument("--allow-probabilistic", action="store_true",
+                        help=f"проверять miller_rabin числа от {MILLER_RABIN_LIMIT} с вероятностным ответом")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    logger.info(f"Запуск {args.workers} процессов")
+
+    if args.compare:
+        summaries = {}
+        for schedule in SCHEDULES:
+            if stop:
+                break
+            telemetry = Telemetry(args.workers)
+            stats = run_pool(args.limit, args.workers, schedule, telemetry, args.progress, engine=args.engine or "trial")
+            log_stats(stats, verbose=True)
+            summaries[schedule] = telemetry.summary()
+        if args.stats_json:
+            args.stats_json.write_text(json.dumps(summaries, indent=2), encoding="utf-8")
+            logger.info(f"Сводки телеметрии по режимам сохранены в {args.stats_json}")
+        return
+
+    telemetry = Telemetry(args.workers)
+    try:
+        if args.input:
+            engine = args.engine or "miller_rabin"
+            max_value = None
+            if engine == "miller_rabin":
+                if args.allow_probabilistic:
+                    logger.warning(f"Для чисел от {MILLER_RABIN_LIMIT} ответ miller_rabin вероятностный")
+                else:
+                    max_value = MILLER_RABIN_LIMIT
+            source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            output = args.output.open(mode="w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                stats = run_stream(
+                    read_numbers(source, max_value), args.workers, output, engine, telemetry, args.progress,
+                    args.batch_size
+                )
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+                if output is not sys.stdout:
+                    output.close()
+            log_stats(stats)
+            if stats.failed or telemetry.failed:
+                sys.exit(1)  # вывод неполный, вызывающий должен об этом узнать
+        elif args.cache:
+            run_cached(
+                args.cache, args.limit, args.workers, args.schedule, telemetry, args.progress, args.engine or "trial"
+            )
+        else:
+            stats = run_pool(
+                args.limit, args.workers, args.schedule, telemetry, args.progress, engine=args.engine or "trial"
+            )
+            log_stats(stats)
+    finally:
+        if args.stats_json:
+            telemetry.write_json(args.stats_json)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()